@@ -15,8 +15,34 @@ from datetime import datetime
 import threading
 import os
 
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    CSV_ENGINE = 'c'
+
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    EXCEL_ENGINE = 'openpyxl'
+
+try:
+    import xlsxwriter  # noqa: F401
+    XLSX_WRITER_ENGINE = 'xlsxwriter'
+except ImportError:
+    XLSX_WRITER_ENGINE = 'openpyxl'
+
 warnings.filterwarnings('ignore')
 
+# Source columns copied into the filled table
+COMPLOT_COLUMNS = ['קישור לקובץ', 'דיסק', 'משלוח', 'ארגז', 'תיק בניין',
+                   'מספר בקשה', 'גוש', 'חלקה', 'מגרש', 'כתובת']
+LAYER_COLUMNS = ['קישור לקובץ', 'גוש', 'חלקה', 'מגרש', 'כתובת']
+
+# Fields compared between the two sources
+COMPARE_FIELDS = ['גוש', 'חלקה', 'מגרש', 'כתובת']
+
 class TableFiller:
     """Modular table filling functionality that can be used independently"""
     
@@ -26,181 +52,206 @@ class TableFiller:
         self.recommendations_path = recommendations_path
         self.complot_df = None
         self.layer_df = None
-        self.rec_df = None
+        self._rec_df = None
         self.filled_df = None
         self.report = []
 
-    def clean_numeric_field(self, value):
-        """Clean numeric fields, handling <Null> and other non-numeric values"""
-        if pd.isna(value) or value == '<Null>' or value == 'nan' or value == '':
-            return np.nan
-        try:
-            return float(value)
-        except:
-            return value
-
-    def compare_values(self, val1, val2):
-        """Compare two values with smart handling of types and nulls"""
-        # Both NaN = equal
-        if pd.isna(val1) and pd.isna(val2):
-            return True
-        # One NaN = not equal
-        if pd.isna(val1) or pd.isna(val2):
-            return False
-        # Convert to string and strip for comparison
-        str1 = str(val1).strip().lower()
-        str2 = str(val2).strip().lower()
-        return str1 == str2
+    @property
+    def rec_df(self):
+        """Recommendations template, read on first access"""
+        if self._rec_df is None:
+            self._rec_df = pd.read_excel(self.recommendations_path)
+        return self._rec_df
 
     def load_data(self):
         """Load all data files"""
         # Load Complot CSV
-        self.complot_df = pd.read_csv(self.complot_path)
+        header = pd.read_csv(self.complot_path, nrows=0).columns
+        self.complot_df = pd.read_csv(
+            self.complot_path, engine=CSV_ENGINE,
+            usecols=[column for column in header if column.strip() in COMPLOT_COLUMNS],
+            na_values=['<Null>']
+        )
         self.complot_df.columns = self.complot_df.columns.str.strip()
 
         # Load Layer Excel
-        self.layer_df = pd.read_excel(self.layer_path)
+        self.layer_df = pd.read_excel(
+            self.layer_path, engine=EXCEL_ENGINE,
+            usecols=lambda column: str(column).strip() in LAYER_COLUMNS
+        )
         self.layer_df.columns = self.layer_df.columns.str.strip()
 
-        # Load Recommendations Excel
-        self.rec_df = pd.read_excel(self.recommendations_path)
-
     def clean_data(self):
         """Clean and standardize data"""
         # Clean numeric fields
         numeric_fields = ['חלקה', 'מגרש', 'גוש']
 
         for field in numeric_fields:
-            if field in self.layer_df.columns:
-                self.layer_df[field] = self.layer_df[field].apply(self.clean_numeric_field)
-            if field in self.complot_df.columns:
-                self.complot_df[field] = self.complot_df[field].apply(self.clean_numeric_field)
+            for df in (self.layer_df, self.complot_df):
+                if field in df.columns:
+                    values = df[field].mask(df[field].isin(['<Null>', 'nan', '']))
+                    numbers = pd.to_numeric(values, errors='coerce').astype('float64')
+                    # Keep values that are not numbers (e.g. "12/3") as they are
+                    df[field] = numbers.where(numbers.notna() | values.isna(), values)
 
         # Clean text fields
         text_fields = ['כתובת', 'קישור לקובץ']
         for field in text_fields:
-            if field in self.layer_df.columns:
-                self.layer_df[field] = self.layer_df[field].apply(
-                    lambda x: x.strip() if isinstance(x, str) else x
-                )
+            for df in (self.layer_df, self.complot_df):
+                if field in df.columns:
+                    df[field] = df[field].astype('string').str.strip()
+
+        # Store low-cardinality Complot columns as categories
+        for field in ['דיסק', 'משלוח', 'ארגז']:
             if field in self.complot_df.columns:
-                self.complot_df[field] = self.complot_df[field].apply(
-                    lambda x: x.strip() if isinstance(x, str) else x
-                )
+                self.complot_df[field] = self.complot_df[field].astype('category')
+
+        # Keep the first record for each file link
+        self.complot_df = self.complot_df.drop_duplicates(subset='קישור לקובץ', keep='first')
+        self.layer_df = self.layer_df.drop_duplicates(subset='קישור לקובץ', keep='first')
+
+        self.normalize_compare_columns()
+
+    def normalize_compare_columns(self):
+        """Add stripped, case-folded copies of the compared fields"""
+        for field in COMPARE_FIELDS:
+            for df in (self.layer_df, self.complot_df):
+                if field in df.columns:
+                    df[f'_{field}_norm'] = df[field].astype('string').str.strip().str.casefold()
 
     def process_matches(self):
         """Process and match records between Complot and Layer"""
-        # Initialize filled dataframe
-        self.filled_df = pd.DataFrame()
-
-        # Get all unique file links
-        complot_links = set(self.complot_df['קישור לקובץ'].dropna().unique())
-        layer_links = set(self.layer_df['קישור לקובץ'].dropna().unique())
-        all_links = complot_links | layer_links
-
-        # Process each link
-        rows = []
-        perfect_matches = 0
-        partial_matches = 0
-
-        for link in sorted(all_links):
-            row = {}
-
-            # Get complot data
-            complot_match = self.complot_df[self.complot_df['קישור לקובץ'] == link]
-            if not complot_match.empty:
-                c = complot_match.iloc[0]
-                row['מהקומפלוט - \nקישור לקובץ'] = c.get('קישור לקובץ', '')
-                row['מהקומפלוט - \nדיסק'] = c.get('דיסק', '')
-                row['מהקומפלוט - \nמשלוח'] = c.get('משלוח', '')
-                row['מהקומפלוט - \nארגז'] = c.get('ארגז', '')
-                row['מהקומפלוט - \nתיק בניין'] = c.get('תיק בניין', '')
-                row['מהקומפלוט - \nמספר בקשה'] = c.get('מספר בקשה', '')
-                row['מהקומפלוט - \nגוש'] = c.get('גוש', '')
-                row['מהקומפלוט - \nחלקה'] = c.get('חלקה', '')
-                row['מהקומפלוט - \nמגרש'] = c.get('מגרש', '')
-                row['מהקומפלוט - \nכתובת'] = c.get('כתובת', '')
-
-            # Get layer data
-            layer_match = self.layer_df[self.layer_df['קישור לקובץ'] == link]
-            if not layer_match.empty:
-                l = layer_match.iloc[0]
-                row['מהשכבה - \nקישור לקובץ'] = l.get('קישור לקובץ', '')
-                row['מהשכבה - \nגוש\nלפי בדיקה גאוגרפית'] = l.get('גוש', '')
-                row['מהשכבה - \nחלקה\nלפי בדיקה גאוגרפית'] = l.get('חלקה', '')
-                row['מהשכבה - \nמגרש\nלפי בדיקה גאוגרפית'] = l.get('מגרש', '')
-                row['מהשכבה - \nכתובת\nלפי בדיקה גאוגרפית'] = l.get('כתובת', '')
-
-            # Perform comparisons if both sources have data
-            if not complot_match.empty and not layer_match.empty:
-                c = complot_match.iloc[0]
-                l = layer_match.iloc[0]
-
-                row['השוואה - \nקישור לקובץ\n(הערך החד ערכי\nהתוצאה חייבת\nלהיות TRUE)'] = True
-
-                # Compare fields
-                gush_match = self.compare_values(c.get('גוש'), l.get('גוש'))
-                helka_match = self.compare_values(c.get('חלקה'), l.get('חלקה'))
-                migrash_match = self.compare_values(c.get('מגרש'), l.get('מגרש'))
-                address_match = self.compare_values(c.get('כתובת'), l.get('כתובת'))
-
-                row['השוואה - \nגוש'] = gush_match
-                row['השוואה - \nחלקה'] = helka_match
-                row['השוואה - \nמגרש'] = migrash_match
-                row['השוואה - \nכתובת'] = address_match
-
-                # Add notes for discrepancies
-                discrepancies = []
-                if not gush_match:
-                    discrepancies.append(f"גוש ({c.get('גוש')} ≠ {l.get('גוש')})")
-                if not helka_match:
-                    discrepancies.append(f"חלקה ({c.get('חלקה')} ≠ {l.get('חלקה')})")
-                if not migrash_match:
-                    discrepancies.append(f"מגרש ({c.get('מגרש')} ≠ {l.get('מגרש')})")
-                if not address_match:
-                    discrepancies.append(f"כתובת")
-
-                if discrepancies:
-                    row['הערות'] = "אי התאמה: " + ", ".join(discrepancies)
-                    partial_matches += 1
-                else:
-                    row['הערות'] = "התאמה מלאה"
-                    perfect_matches += 1
-            elif not complot_match.empty:
-                row['הערות'] = "נמצא בקומפלוט בלבד"
-            elif not layer_match.empty:
-                row['הערות'] = "נמצא בשכבה בלבד"
-
-            rows.append(row)
-
-        self.filled_df = pd.DataFrame(rows)
+        # Keep only the columns we report on
+        norm_columns = [f'_{field}_norm' for field in COMPARE_FIELDS]
+        complot_sub = self.complot_df.reindex(columns=COMPLOT_COLUMNS + norm_columns)
+        complot_sub = complot_sub.dropna(subset=['קישור לקובץ'])
+        layer_sub = self.layer_df.reindex(columns=LAYER_COLUMNS + norm_columns)
+        layer_sub = layer_sub.dropna(subset=['קישור לקובץ'])
+
+        # Encode links as sorted integer codes so the join hashes small ints
+        codes, links = pd.factorize(
+            pd.concat([complot_sub['קישור לקובץ'], layer_sub['קישור לקובץ']]), sort=True
+        )
+        complot_sub['_key_code'] = codes[:len(complot_sub)]
+        layer_sub['_key_code'] = codes[len(complot_sub):]
+
+        # Match all links in a single hash join, ordered by link
+        merged = complot_sub.drop(columns='קישור לקובץ').merge(
+            layer_sub.drop(columns='קישור לקובץ'), on='_key_code', how='outer',
+            sort=True, suffixes=('_c', '_l'), indicator=True, validate='one_to_one'
+        )
+        merged['קישור לקובץ'] = links.take(merged['_key_code'])
+
+        in_complot = merged['_merge'] != 'right_only'
+        in_layer = merged['_merge'] != 'left_only'
+        in_both = merged['_merge'] == 'both'
+
+        # Compare the normalized fields column-wise
+        matches = {}
+        notes_by_field = []
+        for field in COMPARE_FIELDS:
+            c = merged[f'_{field}_norm_c']
+            l = merged[f'_{field}_norm_l']
+            match = ((c == l).fillna(False) | (c.isna() & l.isna())).astype(bool)
+            matches[field] = match.astype('boolean').where(in_both)
+
+            # Add notes for discrepancies, formatting only the mismatched rows
+            mismatch = in_both & ~match
+            note = pd.Series('', index=merged.index, dtype=object)
+            if field == 'כתובת':
+                note[mismatch] = f"{field}, "
+            elif mismatch.any():
+                c_value = merged.loc[mismatch, f'{field}_c'].astype('string').fillna('nan')
+                l_value = merged.loc[mismatch, f'{field}_l'].astype('string').fillna('nan')
+                note[mismatch] = f"{field} (" + c_value + " ≠ " + l_value + "), "
+            notes_by_field.append(note)
+
+        # Join the per-field notes in one pass and drop the trailing separator
+        discrepancies = notes_by_field[0].str.cat(notes_by_field[1:]).str.rstrip(", ")
+        has_discrepancy = discrepancies != ''
+
+        notes = np.select(
+            [in_both & has_discrepancy, in_both, merged['_merge'] == 'left_only'],
+            ["אי התאמה: " + discrepancies, "התאמה מלאה", "נמצא בקומפלוט בלבד"],
+            default="נמצא בשכבה בלבד"
+        )
+
+        # Build the filled table column by column
+        self.filled_df = pd.DataFrame({
+            'מהקומפלוט - \nקישור לקובץ': merged['קישור לקובץ'].where(in_complot),
+            'מהקומפלוט - \nדיסק': merged['דיסק'],
+            'מהקומפלוט - \nמשלוח': merged['משלוח'],
+            'מהקומפלוט - \nארגז': merged['ארגז'],
+            'מהקומפלוט - \nתיק בניין': merged['תיק בניין'],
+            'מהקומפלוט - \nמספר בקשה': merged['מספר בקשה'],
+            'מהקומפלוט - \nגוש': merged['גוש_c'],
+            'מהקומפלוט - \nחלקה': merged['חלקה_c'],
+            'מהקומפלוט - \nמגרש': merged['מגרש_c'],
+            'מהקומפלוט - \nכתובת': merged['כתובת_c'],
+            'מהשכבה - \nקישור לקובץ': merged['קישור לקובץ'].where(in_layer),
+            'מהשכבה - \nגוש\nלפי בדיקה גאוגרפית': merged['גוש_l'],
+            'מהשכבה - \nחלקה\nלפי בדיקה גאוגרפית': merged['חלקה_l'],
+            'מהשכבה - \nמגרש\nלפי בדיקה גאוגרפית': merged['מגרש_l'],
+            'מהשכבה - \nכתובת\nלפי בדיקה גאוגרפית': merged['כתובת_l'],
+            'השוואה - \nקישור לקובץ\n(הערך החד ערכי\nהתוצאה חייבת\nלהיות TRUE)': (
+                in_both.astype('boolean').where(in_both)
+            ),
+            'השוואה - \nגוש': matches['גוש'],
+            'השוואה - \nחלקה': matches['חלקה'],
+            'השוואה - \nמגרש': matches['מגרש'],
+            'השוואה - \nכתובת': matches['כתובת'],
+            'הערות': notes,
+        }, copy=False)
+
+        perfect_matches = int((in_both & ~has_discrepancy).sum())
+        partial_matches = int((in_both & has_discrepancy).sum())
 
         return perfect_matches, partial_matches, len(self.filled_df)
 
     def save_results(self, output_path):
         """Save the filled table and report"""
         # Save filled table
-        self.filled_df.to_excel(output_path, index=False)
+        if XLSX_WRITER_ENGINE == 'xlsxwriter':
+            # Keep file links as plain text; xlsxwriter drops links past its hyperlink limits
+            with pd.ExcelWriter(output_path, engine='xlsxwriter',
+                                engine_kwargs={'options': {'strings_to_urls': False}}) as writer:
+                self.filled_df.to_excel(writer, index=False)
+        else:
+            self.filled_df.to_excel(output_path, index=False, engine=XLSX_WRITER_ENGINE)
 
         # Save report
         report_path = output_path.replace('.xlsx', '_report.txt')
+        separator = "=" * 50
         with open(report_path, 'w', encoding='utf-8') as f:
-            f.write("Automatic Table Filling Report\n")
-            f.write("=" * 50 + "\n")
-            f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write("=" * 50 + "\n\n")
-            f.write(f"Complot file: {self.complot_path}\n")
-            f.write(f"Layer file: {self.layer_path}\n")
-            f.write(f"Recommendations file: {self.recommendations_path}\n")
-            f.write(f"Output file: {output_path}\n")
+            f.write(
+                f"Automatic Table Filling Report\n"
+                f"{separator}\n"
+                f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+                f"{separator}\n\n"
+                f"Complot file: {self.complot_path}\n"
+                f"Layer file: {self.layer_path}\n"
+                f"Recommendations file: {self.recommendations_path}\n"
+                f"Output file: {output_path}\n"
+            )
             
         return output_path, report_path
 
-    def run(self, output_path):
-        """Execute the complete filling process"""
+    def run(self, output_path, progress_callback=None):
+        """Execute the complete filling process
+
+        progress_callback, if given, is called as progress_callback(percent, message)
+        after each stage completes.
+        """
+        def report_progress(percent, message):
+            if progress_callback is not None:
+                progress_callback(percent, message)
+
         self.load_data()
+        report_progress(30, "Cleaning data...")
         self.clean_data()
+        report_progress(45, "Matching records...")
         perfect_matches, partial_matches, total_rows = self.process_matches()
+        report_progress(80, "Saving results...")
         filled_path, report_path = self.save_results(output_path)
         
         return {
@@ -342,7 +393,7 @@ class QualityCheckGUI:
         
         # Disable run button during processing
         self.run_button.config(state=tk.DISABLED)
-        self.status_var.set("Processing...")
+        self.status_var.set("Loading data files...")
         self.progress['value'] = 0
         
         # Run in separate thread to keep UI responsive
@@ -357,7 +408,7 @@ class QualityCheckGUI:
                 self.rec_path_var.get()
             )
             
-            result = filler.run(self.output_path_var.get())
+            result = filler.run(self.output_path_var.get(), self._report_progress)
             
             # Update UI in main thread
             self.root.after(0, self._update_ui_success, result)
@@ -366,6 +417,14 @@ class QualityCheckGUI:
             # Handle errors in main thread
             self.root.after(0, self._update_ui_error, str(e))
     
+    def _report_progress(self, percent, message):
+        # Called from the worker thread; hand the update to the main thread
+        self.root.after(0, self._update_ui_progress, percent, message)
+
+    def _update_ui_progress(self, percent, message):
+        self.progress['value'] = percent
+        self.status_var.set(message)
+
     def _update_ui_success(self, result):
         self.progress['value'] = 100
         self.status_var.set("Process completed successfully!")
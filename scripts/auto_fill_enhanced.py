@@ -39,11 +39,14 @@ class TableFiller:
     
     def compare_values(self, val1, val2):
         """Compare two values with smart handling of types and nulls"""
+        # Cheap scalar null test (NaN is the only value not equal to itself)
+        missing1 = val1 is None or val1 is pd.NA or val1 != val1
+        missing2 = val2 is None or val2 is pd.NA or val2 != val2
         # Both NaN = equal
-        if pd.isna(val1) and pd.isna(val2):
+        if missing1 and missing2:
             return True
         # One NaN = not equal
-        if pd.isna(val1) or pd.isna(val2):
+        if missing1 or missing2:
             return False
         # Convert to string and strip for comparison
         str1 = str(val1).strip().lower()
@@ -113,27 +116,30 @@ class TableFiller:
         self.filled_df = pd.DataFrame()
         
         # Get all unique file links
-        complot_links = set(self.complot_df['קישור לקובץ'].dropna().unique())
-        layer_links = set(self.layer_df['קישור לקובץ'].dropna().unique())
-        all_links = complot_links | layer_links
+        complot_links = pd.Index(self.complot_df['קישור לקובץ'].dropna().unique())
+        layer_links = pd.Index(self.layer_df['קישור לקובץ'].dropna().unique())
+        all_links = complot_links.union(layer_links).sort_values()
+        complot_only = len(complot_links.difference(layer_links))
+        layer_only = len(layer_links.difference(complot_links))
+        in_both = len(complot_links.intersection(layer_links))
         
         print(f"  • Found {len(all_links)} unique file links")
-        print(f"    - In Complot only: {len(complot_links - layer_links)}")
-        print(f"    - In Layer only: {len(layer_links - complot_links)}")
-        print(f"    - In both: {len(complot_links & layer_links)}")
+        print(f"    - In Complot only: {complot_only}")
+        print(f"    - In Layer only: {layer_only}")
+        print(f"    - In both: {in_both}")
         
         self.report.append(f"\nFile Link Analysis:")
         self.report.append(f"- Total unique links: {len(all_links)}")
-        self.report.append(f"- Complot only: {len(complot_links - layer_links)}")
-        self.report.append(f"- Layer only: {len(layer_links - complot_links)}")
-        self.report.append(f"- In both sources: {len(complot_links & layer_links)}")
+        self.report.append(f"- Complot only: {complot_only}")
+        self.report.append(f"- Layer only: {layer_only}")
+        self.report.append(f"- In both sources: {in_both}")
         
         # Process each link
         rows = []
         perfect_matches = 0
         partial_matches = 0
         
-        for i, link in enumerate(sorted(all_links), 1):
+        for i, link in enumerate(all_links, 1):
             if i % 50 == 0:
                 print(f"  • Processed {i}/{len(all_links)} links...")
             
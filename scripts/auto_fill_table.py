@@ -8,28 +8,207 @@ Created by: Eitan
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import tempfile
 import warnings
+
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = 'pyarrow'
+    KEY_DTYPE = 'string[pyarrow]'
+    CACHE_INPUTS = True
+except ImportError:
+    CSV_ENGINE = 'c'
+    KEY_DTYPE = 'string'
+    CACHE_INPUTS = False
+
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    EXCEL_ENGINE = 'openpyxl'
+
+try:
+    import xlsxwriter
+    XLSX_WRITER_ENGINE = 'xlsxwriter'
+except ImportError:
+    XLSX_WRITER_ENGINE = 'openpyxl'
+
 warnings.filterwarnings('ignore')
 
-def clean_numeric_field(value):
+# Bump when the readers change so old cached inputs are not reused
+CACHE_VERSION = 1
+CACHE_DIR = Path(tempfile.gettempdir()) / 'quality_check_cache'
+# Prefix of the columns holding per-cell value types for mixed columns in a cached copy
+CACHE_TYPE_PREFIX = '__cache_type__:'
+CACHE_VALUE_TYPES = {'int': int, 'float': float, 'str': str}
+
+# Source columns and the table headers they are copied to
+COMPLOT_COLUMNS = {
+    'קישור לקובץ': 'מהקומפלוט - \nקישור לקובץ',
+    'דיסק': 'מהקומפלוט - \nדיסק',
+    'משלוח': 'מהקומפלוט - \nמשלוח',
+    'ארגז': 'מהקומפלוט - \nארגז',
+    'תיק בניין': 'מהקומפלוט - \nתיק בניין',
+    'מספר בקשה': 'מהקומפלוט - \nמספר בקשה',
+    'גוש': 'מהקומפלוט - \nגוש',
+    'חלקה': 'מהקומפלוט - \nחלקה',
+    'מגרש': 'מהקומפלוט - \nמגרש',
+    'כתובת': 'מהקומפלוט - \nכתובת',
+}
+LAYER_COLUMNS = {
+    'קישור לקובץ': 'מהשכבה - \nקישור לקובץ',
+    'גוש': 'מהשכבה - \nגוש\nלפי בדיקה גאוגרפית',
+    'חלקה': 'מהשכבה - \nחלקה\nלפי בדיקה גאוגרפית',
+    'מגרש': 'מהשכבה - \nמגרש\nלפי בדיקה גאוגרפית',
+    'כתובת': 'מהשכבה - \nכתובת\nלפי בדיקה גאוגרפית',
+}
+
+# Compared fields: (name, Complot header, Layer header)
+COMPARED_FIELDS = [
+    (field, COMPLOT_COLUMNS[field], LAYER_COLUMNS[field])
+    for field in ['גוש', 'חלקה', 'מגרש', 'כתובת']
+]
+
+def clean_numeric_column(column):
     """Clean numeric fields, handling <Null> and other non-numeric values"""
-    if pd.isna(value) or value == '<Null>' or value == 'nan':
-        return np.nan
-    try:
-        return float(value)
-    except:
-        return value
-
-def compare_values(val1, val2):
-    """Compare two values, handling NaN and type differences"""
-    # If both are NaN, consider them equal
-    if pd.isna(val1) and pd.isna(val2):
-        return True
-    # If one is NaN and the other isn't, they're not equal
-    if pd.isna(val1) or pd.isna(val2):
-        return False
+    values = column.mask(column.isin(['<Null>', 'nan']))
+    numbers = pd.to_numeric(values, errors='coerce').astype('float64')
+    # Keep values that are not numbers (e.g. "12/3") as they are
+    return numbers.where(numbers.notna() | values.isna(), values)
+
+def columns_equal(col1, col2):
+    """Compare two aligned columns, handling NaN and type differences"""
     # Convert to string for comparison to avoid type issues
-    return str(val1).strip() == str(val2).strip()
+    text = pd.concat([col1, col2], ignore_index=True).astype('string').str.strip()
+    # Encode both columns with shared integer codes; NaN gets -1 on both sides,
+    # so two NaNs compare equal and one NaN never matches a value
+    codes, _ = pd.factorize(text)
+    return pd.Series(codes[:len(col1)] == codes[len(col1):], index=col1.index)
+
+def strip_column_names(df):
+    """Strip whitespace from column names, renaming only the ones that need it"""
+    rename = {col: col.strip() for col in df.columns if isinstance(col, str) and col != col.strip()}
+    if rename:
+        df.rename(columns=rename, inplace=True)
+
+def read_complot(path):
+    """Read the Complot CSV, keeping only the columns used by the table"""
+    header = pd.read_csv(path, nrows=0).columns
+    return pd.read_csv(
+        path, engine=CSV_ENGINE,
+        usecols=[col for col in header if col.strip() in COMPLOT_COLUMNS]
+    )
+
+def read_layer(path):
+    """Read the Layer Excel, keeping only the columns used by the table"""
+    return pd.read_excel(
+        path, engine=EXCEL_ENGINE,
+        usecols=lambda col: str(col).strip() in LAYER_COLUMNS
+    )
+
+def read_recommendations(path):
+    """Read the recommendations template"""
+    return pd.read_excel(path, engine=EXCEL_ENGINE)
+
+def to_cache_frame(df):
+    """Store object columns mixing numbers and text as text plus a type per cell,
+    since feather can only hold one type per column"""
+    frame = df
+    for col in df.columns[df.dtypes == object]:
+        types = df[col].map(lambda value: type(value).__name__)
+        if not types.isin(list(CACHE_VALUE_TYPES)).all() or (types == 'str').all():
+            continue
+        if frame is df:
+            frame = df.copy()
+        frame[col] = df[col].astype(str)
+        frame[CACHE_TYPE_PREFIX + col] = types
+    return frame
+
+def from_cache_frame(frame):
+    """Restore the mixed columns split by to_cache_frame"""
+    for type_col in [col for col in frame.columns if col.startswith(CACHE_TYPE_PREFIX)]:
+        types = frame.pop(type_col)
+        text = frame[type_col[len(CACHE_TYPE_PREFIX):]]
+        values = text.to_numpy(dtype=object).copy()
+        for name, convert in CACHE_VALUE_TYPES.items():
+            cells = (types == name).to_numpy()
+            values[cells] = [convert(value) for value in values[cells]]
+        frame[text.name] = pd.Series(values, index=frame.index, dtype=object)
+    return frame
+
+def cached_read(path, reader):
+    """Read a file with reader, reusing a feather copy if the file is unchanged"""
+    if not CACHE_INPUTS:
+        return reader(path)
+    
+    # Key on everything that shapes the result, not just the file contents
+    settings = repr((CACHE_VERSION, reader.__name__, CSV_ENGINE, EXCEL_ENGINE,
+                     list(COMPLOT_COLUMNS), list(LAYER_COLUMNS)))
+    digest = hashlib.md5(settings.encode('utf-8'))
+    digest.update(Path(path).read_bytes())
+    # Keep a single entry per reader and source file; older copies are removed on write
+    prefix = f"{reader.__name__}_{hashlib.md5(str(Path(path).resolve()).encode('utf-8')).hexdigest()}"
+    cache_path = CACHE_DIR / f'{prefix}_{digest.hexdigest()}.feather'
+    if cache_path.exists():
+        try:
+            return from_cache_frame(pd.read_feather(cache_path))
+        except Exception:
+            # Damaged or unreadable copy; read the source again
+            pass
+    
+    df = reader(path)
+    tmp_path = None
+    try:
+        CACHE_DIR.mkdir(exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, prefix=prefix, suffix='.tmp')
+        os.close(fd)
+        to_cache_frame(df).to_feather(tmp_path)
+        # Publish the finished file in one step so readers never see a partial copy
+        os.replace(tmp_path, cache_path)
+        tmp_path = None
+        for stale in CACHE_DIR.glob(f'{prefix}_*.feather'):
+            if stale != cache_path:
+                stale.unlink(missing_ok=True)
+    except (OSError, ValueError, TypeError) as e:
+        # Values feather can't store (e.g. dates mixed with text); read the source every run
+        print(f"  • Not caching {Path(path).name}: {e}")
+    finally:
+        if tmp_path is not None:
+            Path(tmp_path).unlink(missing_ok=True)
+    return df
+
+def write_excel(df, path):
+    """Write df to a single-sheet workbook, streaming rows when xlsxwriter is available"""
+    if XLSX_WRITER_ENGINE != 'xlsxwriter':
+        df.to_excel(path, index=False, engine=XLSX_WRITER_ENGINE)
+        return
+    
+    # constant_memory flushes each row once the next one starts, so cells must
+    # be written strictly row by row
+    workbook = xlsxwriter.Workbook(path, {
+        'constant_memory': True,
+        # Write ±inf as Excel errors and dates as dates, as to_excel does
+        'nan_inf_to_errors': True,
+        'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+        # Keep file links as plain text; hyperlinks are capped in length and count
+        'strings_to_urls': False,
+    })
+    try:
+        worksheet = workbook.add_worksheet()
+        header_format = workbook.add_format(
+            {'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'}
+        )
+        worksheet.write_row(0, 0, [str(col) for col in df.columns], header_format)
+        values = df.astype(object).where(df.notna(), None)
+        for row, record in enumerate(values.itertuples(index=False, name=None), start=1):
+            # write_row stops at the first cell it can't write and only returns an error code
+            if worksheet.write_row(row, 0, record):
+                raise ValueError(f"Could not write row {row + 1} to {path}")
+    finally:
+        workbook.close()
 
 def main():
     print("=" * 70)
@@ -44,158 +223,110 @@ def main():
     
     # Read files
     print("\n📁 Reading input files...")
-    complot_df = pd.read_csv(complot_path)
-    layer_df = pd.read_excel(layer_path)
-    rec_df = pd.read_excel(recommendations_path)
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        complot_future = executor.submit(cached_read, complot_path, read_complot)
+        layer_future = executor.submit(cached_read, layer_path, read_layer)
+        rec_future = executor.submit(cached_read, recommendations_path, read_recommendations)
+        complot_df = complot_future.result()
+        layer_df = layer_future.result()
+        rec_df = rec_future.result()
     
     print(f"  • Complot records: {len(complot_df)}")
     print(f"  • Layer records: {len(layer_df)}")
     print(f"  • Recommendations table rows: {len(rec_df)}")
     
     # Clean column names
-    complot_df.columns = complot_df.columns.str.strip()
-    layer_df.columns = layer_df.columns.str.strip()
+    strip_column_names(complot_df)
+    strip_column_names(layer_df)
+    
+    # Store file links as strings for hashing and matching
+    complot_df['קישור לקובץ'] = complot_df['קישור לקובץ'].astype(KEY_DTYPE)
+    layer_df['קישור לקובץ'] = layer_df['קישור לקובץ'].astype(KEY_DTYPE)
     
     # Clean numeric fields in layer data
-    layer_df['חלקה'] = layer_df['חלקה'].apply(clean_numeric_field)
-    layer_df['מגרש'] = layer_df['מגרש'].apply(clean_numeric_field)
-    layer_df['גוש'] = layer_df['גוש'].apply(clean_numeric_field)
+    layer_df['חלקה'] = clean_numeric_column(layer_df['חלקה'])
+    layer_df['מגרש'] = clean_numeric_column(layer_df['מגרש'])
+    layer_df['גוש'] = clean_numeric_column(layer_df['גוש'])
     
     # Clean numeric fields in complot data
-    complot_df['חלקה'] = complot_df['חלקה'].apply(clean_numeric_field)
-    complot_df['מגרש'] = complot_df['מגרש'].apply(clean_numeric_field)
-    complot_df['גוש'] = complot_df['גוש'].apply(clean_numeric_field)
+    complot_df['חלקה'] = clean_numeric_column(complot_df['חלקה'])
+    complot_df['מגרש'] = clean_numeric_column(complot_df['מגרש'])
+    complot_df['גוש'] = clean_numeric_column(complot_df['גוש'])
     
-    # Create a new DataFrame for the filled recommendations
-    filled_df = rec_df.copy()
+    # Block, parcel and plot numbers repeat across many records; store as categories
+    for field in ['גוש', 'חלקה', 'מגרש']:
+        complot_df[field] = complot_df[field].astype('category')
+        layer_df[field] = layer_df[field].astype('category')
     
     print("\n🔄 Processing matches and filling table...")
     
-    # Get unique file links from both sources
-    all_file_links = set()
-    if 'קישור לקובץ' in complot_df.columns:
-        all_file_links.update(complot_df['קישור לקובץ'].dropna().unique())
-    if 'קישור לקובץ' in layer_df.columns:
-        all_file_links.update(layer_df['קישור לקובץ'].dropna().unique())
+    # Select the fields to copy and rename them to the table headers
+    complot_sub = complot_df.reindex(columns=list(COMPLOT_COLUMNS))
+    complot_sub = complot_sub.dropna(subset=['קישור לקובץ'])
+    complot_sub = complot_sub.drop_duplicates(subset='קישור לקובץ', keep='first')
+    complot_sub = complot_sub.rename(columns=COMPLOT_COLUMNS)
     
-    # Process each unique file link
-    matches_found = 0
-    rows_filled = 0
+    layer_sub = layer_df.reindex(columns=list(LAYER_COLUMNS))
+    layer_sub = layer_sub.dropna(subset=['קישור לקובץ'])
+    layer_sub = layer_sub.drop_duplicates(subset='קישור לקובץ', keep='first')
+    layer_sub = layer_sub.rename(columns=LAYER_COLUMNS)
     
-    for i, file_link in enumerate(all_file_links):
-        if pd.isna(file_link):
-            continue
-            
-        # Find matching records in complot
-        complot_match = complot_df[complot_df['קישור לקובץ'] == file_link]
-        
-        # Find matching records in layer
-        layer_match = layer_df[layer_df['קישור לקובץ'] == file_link]
-        
-        if not complot_match.empty or not layer_match.empty:
-            # If we need more rows, add them
-            if i >= len(filled_df):
-                new_row = pd.Series(dtype=object)
-                filled_df = pd.concat([filled_df, pd.DataFrame([new_row])], ignore_index=True)
-            
-            # Fill complot data
-            if not complot_match.empty:
-                row = complot_match.iloc[0]
-                filled_df.loc[i, 'מהקומפלוט - \nקישור לקובץ'] = row.get('קישור לקובץ', '')
-                filled_df.loc[i, 'מהקומפלוט - \nדיסק'] = row.get('דיסק', '')
-                filled_df.loc[i, 'מהקומפלוט - \nמשלוח'] = row.get('משלוח', '')
-                filled_df.loc[i, 'מהקומפלוט - \nארגז'] = row.get('ארגז', '')
-                filled_df.loc[i, 'מהקומפלוט - \nתיק בניין'] = row.get('תיק בניין', '')
-                filled_df.loc[i, 'מהקומפלוט - \nמספר בקשה'] = row.get('מספר בקשה', '')
-                filled_df.loc[i, 'מהקומפלוט - \nגוש'] = row.get('גוש', '')
-                filled_df.loc[i, 'מהקומפלוט - \nחלקה'] = row.get('חלקה', '')
-                filled_df.loc[i, 'מהקומפלוט - \nמגרש'] = row.get('מגרש', '')
-                filled_df.loc[i, 'מהקומפלוט - \nכתובת'] = row.get('כתובת', '')
-            
-            # Fill layer data
-            if not layer_match.empty:
-                row = layer_match.iloc[0]
-                filled_df.loc[i, 'מהשכבה - \nקישור לקובץ'] = row.get('קישור לקובץ', '')
-                filled_df.loc[i, 'מהשכבה - \nגוש\nלפי בדיקה גאוגרפית'] = row.get('גוש', '')
-                filled_df.loc[i, 'מהשכבה - \nחלקה\nלפי בדיקה גאוגרפית'] = row.get('חלקה', '')
-                filled_df.loc[i, 'מהשכבה - \nמגרש\nלפי בדיקה גאוגרפית'] = row.get('מגרש', '')
-                filled_df.loc[i, 'מהשכבה - \nכתובת\nלפי בדיקה גאוגרפית'] = row.get('כתובת', '')
-            
-            # Perform comparisons
-            if not complot_match.empty and not layer_match.empty:
-                matches_found += 1
-                complot_row = complot_match.iloc[0]
-                layer_row = layer_match.iloc[0]
-                
-                # Compare file link (should always be TRUE if we're here)
-                filled_df.loc[i, 'השוואה - \nקישור לקובץ\n(הערך החד ערכי\nהתוצאה חייבת\nלהיות TRUE)'] = True
-                
-                # Compare גוש (Block)
-                filled_df.loc[i, 'השוואה - \nגוש'] = compare_values(
-                    complot_row.get('גוש'), 
-                    layer_row.get('גוש')
-                )
-                
-                # Compare חלקה (Parcel)
-                filled_df.loc[i, 'השוואה - \nחלקה'] = compare_values(
-                    complot_row.get('חלקה'), 
-                    layer_row.get('חלקה')
-                )
-                
-                # Compare מגרש (Plot)
-                filled_df.loc[i, 'השוואה - \nמגרש'] = compare_values(
-                    complot_row.get('מגרש'), 
-                    layer_row.get('מגרש')
-                )
-                
-                # Compare כתובת (Address)
-                filled_df.loc[i, 'השוואה - \nכתובת'] = compare_values(
-                    complot_row.get('כתובת'), 
-                    layer_row.get('כתובת')
-                )
-                
-                # Add note if there are discrepancies
-                discrepancies = []
-                if not compare_values(complot_row.get('גוש'), layer_row.get('גוש')):
-                    discrepancies.append('גוש')
-                if not compare_values(complot_row.get('חלקה'), layer_row.get('חלקה')):
-                    discrepancies.append('חלקה')
-                if not compare_values(complot_row.get('מגרש'), layer_row.get('מגרש')):
-                    discrepancies.append('מגרש')
-                if not compare_values(complot_row.get('כתובת'), layer_row.get('כתובת')):
-                    discrepancies.append('כתובת')
-                
-                if discrepancies:
-                    filled_df.loc[i, 'הערות'] = f"אי התאמה ב: {', '.join(discrepancies)}"
-            
-            rows_filled += 1
+    # Match both sources on the file link in a single outer join
+    filled = complot_sub.merge(
+        layer_sub,
+        left_on='מהקומפלוט - \nקישור לקובץ',
+        right_on='מהשכבה - \nקישור לקובץ',
+        how='outer',
+        sort=True,
+        indicator=True,
+        validate='one_to_one'
+    )
+    in_both = filled.pop('_merge') == 'both'
+    matches_found = int(in_both.sum())
+    rows_filled = len(filled)
+    
+    # Compare file link (always TRUE when found in both sources)
+    filled['השוואה - \nקישור לקובץ\n(הערך החד ערכי\nהתוצאה חייבת\nלהיות TRUE)'] = (
+        pd.Series(True, index=filled.index, dtype=object).where(in_both)
+    )
+    
+    # Compare גוש, חלקה, מגרש and כתובת
+    discrepancies = pd.Series('', index=filled.index, dtype=object)
+    for field, complot_col, layer_col in COMPARED_FIELDS:
+        equal = columns_equal(filled[complot_col], filled[layer_col])
+        filled[f'השוואה - \n{field}'] = equal.astype(object).where(in_both)
+        discrepancies += np.where(equal, '', field + ', ')
+    
+    # Add note if there are discrepancies
+    discrepancies = discrepancies.str.rstrip(', ')
+    filled['הערות'] = ("אי התאמה ב: " + discrepancies).where(in_both & (discrepancies != ''))
+    
+    # Place the results into the recommendations table layout
+    filled_df = rec_df.reindex(range(max(len(rec_df), len(filled))))
+    for column in filled.columns:
+        if column in filled_df.columns:
+            filled_df[column] = filled[column].combine_first(filled_df[column])
+        else:
+            filled_df[column] = filled[column]
     
     # Remove completely empty rows from the end
     filled_df = filled_df.dropna(how='all')
     
     # Save the filled table
     print(f"\n💾 Saving filled table to: {output_path}")
-    filled_df.to_excel(output_path, index=False)
+    write_excel(filled_df, output_path)
     
     # Print summary statistics
     print("\n📊 Summary Statistics:")
-    print(f"  • Total unique file links processed: {len(all_file_links)}")
+    print(f"  • Total unique file links processed: {rows_filled}")
     print(f"  • Matches found (in both sources): {matches_found}")
     print(f"  • Total rows filled: {rows_filled}")
     
     # Check for discrepancies
-    if 'השוואה - \nגוש' in filled_df.columns:
-        gush_matches = filled_df['השוואה - \nגוש'].sum()
-        print(f"\n  • גוש (Block) matches: {gush_matches}/{matches_found}")
-    if 'השוואה - \nחלקה' in filled_df.columns:
-        helka_matches = filled_df['השוואה - \nחלקה'].sum()
-        print(f"  • חלקה (Parcel) matches: {helka_matches}/{matches_found}")
-    if 'השוואה - \nמגרש' in filled_df.columns:
-        migrash_matches = filled_df['השוואה - \nמגרש'].sum()
-        print(f"  • מגרש (Plot) matches: {migrash_matches}/{matches_found}")
-    if 'השוואה - \nכתובת' in filled_df.columns:
-        address_matches = filled_df['השוואה - \nכתובת'].sum()
-        print(f"  • כתובת (Address) matches: {address_matches}/{matches_found}")
+    print()
+    for field, label in [('גוש', 'Block'), ('חלקה', 'Parcel'), ('מגרש', 'Plot'), ('כתובת', 'Address')]:
+        field_matches = filled_df[f'השוואה - \n{field}'].sum()
+        print(f"  • {field} ({label}) matches: {field_matches}/{matches_found}")
     
     print("\n✅ Process completed successfully!")
     print(f"📄 Output file saved as: המלצות_טיוב_מלא.xlsx")
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Regression checks for TableFiller comparisons in the GUI module
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from quality_check_gui import TableFiller
+
+
+def run_matches(tmp_path, complot, layer):
+    complot_path = tmp_path / 'complot.csv'
+    layer_path = tmp_path / 'layer.xlsx'
+    pd.DataFrame(complot).to_csv(complot_path, index=False)
+    pd.DataFrame(layer).to_excel(layer_path, index=False)
+
+    filler = TableFiller(str(complot_path), str(layer_path), str(tmp_path / 'rec.xlsx'))
+    filler.load_data()
+    filler.clean_data()
+    return filler, filler.process_matches()
+
+
+def test_integer_column_matches_column_with_blank_and_text(tmp_path):
+    """An all-integer column must still match a column holding a blank or a text cell"""
+    links = ['a.pdf', 'b.pdf', 'c.pdf']
+    common = {'קישור לקובץ': links, 'חלקה': [1, 2, 3], 'מגרש': [1, 1, 1], 'כתובת': ['x', 'y', 'z']}
+    complot = dict(common, גוש=[6000, 6001, 6002])
+    layer = dict(common, גוש=[6000, np.nan, '6002/1'])
+
+    filler, (perfect_matches, partial_matches, total_rows) = run_matches(tmp_path, complot, layer)
+
+    assert (perfect_matches, partial_matches, total_rows) == (1, 2, 3)
+    assert filler.filled_df['הערות'].tolist() == [
+        'התאמה מלאה',
+        'אי התאמה: גוש (6001.0 ≠ nan)',
+        'אי התאמה: גוש (6002.0 ≠ 6002/1)',
+    ]